@@ -1,13 +1,23 @@
 #!/usr/bin/env python3
 """
 FortiGate Certificate Installation via SSH
-Installs CA-signed certificates on FortiGate using SSH
+Installs CA-signed certificates on FortiGate using a single AsyncSSH session
+
+Requirements:
+pip install asyncssh
 """
 
+import asyncio
+import re
+import string
 import subprocess
 import sys
 import os
-import time
+
+try:
+    import asyncssh
+except ImportError:
+    asyncssh = None
 
 # Configuration
 FORTIGATE_IP = "192.168.0.254"
@@ -15,171 +25,501 @@ FORTIGATE_USER = "admin"
 FORTIGATE_PASS = "!cg@RW%G@o"
 CERT_DIR = "./certificates"
 
-def run_ssh_command(command, expect_prompts=["#"]):
-    """Run SSH command using expect"""
-    expect_script = f"""
-spawn ssh -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null {FORTIGATE_USER}@{FORTIGATE_IP}
-expect "password:"
-send "{FORTIGATE_PASS}\\r"
-expect "#"
-send "{command}\\r"
-expect "#"
-send "exit\\r"
-expect eof
-"""
-
-    proc = subprocess.Popen(
-        ['expect'],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-
-    stdout, stderr = proc.communicate(expect_script)
-    return proc.returncode, stdout, stderr
+# OpenSSH connection sharing for the expect fallback: the first ssh opens a
+# control socket, later invocations attach over it and skip KEX + password auth
+SSH_CONTROL_PATH = "/tmp/fgt-%r@%h:%p"
+SSH_OPTS = (
+    "-o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null "
+    f"-o ControlMaster=auto -o ControlPath={SSH_CONTROL_PATH} -o ControlPersist=60s"
+)
+
+class SSHPool:
+    """Pool of pre-authenticated SSH connections to one device
+
+    Borrowing a live session skips the TCP + key exchange + password auth
+    cost that dominates short admin sessions. Keepalives stop NAT/firewall
+    idle drops from poisoning pooled connections.
+    """
+
+    def __init__(self, host, username, password, max_connections=2):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.max_connections = max_connections
+        self._queue = asyncio.Queue(maxsize=max_connections)
+        self._opened = 0
+
+    async def _connect(self):
+        return await asyncssh.connect(
+            self.host,
+            username=self.username,
+            password=self.password,
+            known_hosts=None,
+            keepalive_interval=30,
+            keepalive_count_max=3
+        )
+
+    async def _get(self):
+        if self._queue.empty() and self._opened < self.max_connections:
+            # Roll the slot count back if the connect fails, or the pool
+            # would permanently believe a connection exists and a later
+            # acquire() would block forever on the empty queue
+            self._opened += 1
+            try:
+                return await self._connect()
+            except BaseException:
+                self._opened -= 1
+                raise
+
+        conn = await self._queue.get()
+
+        # Validate the pooled session is still alive; replace it if not
+        try:
+            await conn.run('', check=False)
+        except (OSError, asyncssh.Error):
+            conn.close()
+            try:
+                conn = await self._connect()
+            except BaseException:
+                self._opened -= 1
+                raise
+
+        return conn
+
+    async def _put(self, conn):
+        # Drop dead connections instead of recycling them; the freed slot
+        # lets a later acquire() open a fresh one
+        if conn.is_closed():
+            self._opened -= 1
+            return
+        await self._queue.put(conn)
+
+    def acquire(self):
+        """Borrow a connection: async with pool.acquire() as conn: ..."""
+        return _PooledConnection(self)
+
+    async def close(self):
+        """Close all pooled connections"""
+        while not self._queue.empty():
+            conn = self._queue.get_nowait()
+            conn.close()
+            await conn.wait_closed()
+            self._opened -= 1
+
+class _PooledConnection:
+    """Async context manager returning a connection to the pool on exit"""
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._conn = None
+
+    async def __aenter__(self):
+        self._conn = await self._pool._get()
+        return self._conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._pool._put(self._conn)
+
+# Compiled once: the plain FortiGate prompt and the (context) # prompt
+# shown inside config sections. asyncssh process streams are text-mode,
+# so the patterns are str rather than bytes.
+PROMPT_RE = re.compile(r'[#$] ?$')
+CONFIG_PROMPT_RE = re.compile(r'\([\w-]+\) #')
+
+# Give up on a prompt after this long, matching the old expect scripts'
+# 'set timeout 60' - otherwise a pager, confirmation question or custom
+# prompt the patterns don't match would hang the whole rollout
+COMMAND_TIMEOUT = 60
+
+async def read_until_prompt(process, timeout=COMMAND_TIMEOUT):
+    """Accumulate shell output until a CLI prompt appears"""
+    try:
+        return await asyncio.wait_for(_read_until_prompt(process), timeout)
+    except asyncio.TimeoutError:
+        raise InstallError(f"timed out after {timeout}s waiting for a CLI prompt")
+
+async def _read_until_prompt(process):
+    buf = ""
+    while True:
+        chunk = await process.stdout.read(4096)
+        if not chunk:
+            raise asyncio.IncompleteReadError(buf.encode(), None)
+        buf += chunk
+        if PROMPT_RE.search(buf) or CONFIG_PROMPT_RE.search(buf):
+            return buf
+
+async def send_commands(process, commands):
+    """Send CLI commands over an open FortiGate shell, waiting for the prompt after each"""
+    output = ""
+    for command in commands:
+        process.stdin.write(command + "\n")
+        output += await read_until_prompt(process)
+    return output
 
 def read_file(filepath):
-    """Read file content"""
-    with open(filepath, 'r') as f:
-        return f.read().strip()
-
-def main():
-    print("🔐 Installing CA-signed certificate on FortiGate via SSH...")
-    print(f"📍 Target: {FORTIGATE_IP}")
-    print(f"👤 User: {FORTIGATE_USER}")
-    print()
-
-    # Check certificate files
+    """Read file content; open() itself is the existence check"""
+    try:
+        with open(filepath, 'r') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        raise SystemExit(
+            f"❌ Certificate files not found in {CERT_DIR}/\n"
+            "   Run: node generate-fortigate-cert.js first"
+        )
+
+def load_certificates():
+    """Read the certificate pair for the FortiGate CLI"""
     cert_file = os.path.join(CERT_DIR, "fortigate.crt")
     key_file = os.path.join(CERT_DIR, "fortigate.key")
 
-    if not os.path.exists(cert_file) or not os.path.exists(key_file):
-        print(f"❌ Certificate files not found in {CERT_DIR}/")
-        print("   Run: node generate-fortigate-cert.js first")
-        sys.exit(1)
-
-    # Read certificates
     print("📄 Reading certificate files...")
     server_cert = read_file(cert_file)
     private_key = read_file(key_file)
 
-    # Escape quotes for FortiGate CLI
-    server_cert_escaped = server_cert.replace('"', '\\"')
-    private_key_escaped = private_key.replace('"', '\\"')
+    # PEM bodies never contain quotes; only pay the escape scan in the
+    # unlikely case one shows up
+    if '"' in server_cert:
+        server_cert = server_cert.replace('"', '\\"')
+    if '"' in private_key:
+        private_key = private_key.replace('"', '\\"')
 
-    print("🔄 Step 1: Testing SSH connection...")
-
-    test_script = f"""
-spawn ssh -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null {FORTIGATE_USER}@{FORTIGATE_IP}
-expect "password:"
-send "{FORTIGATE_PASS}\\r"
-expect "#"
-send "get system status\\r"
-expect "#"
-send "exit\\r"
-expect eof
-"""
+    return server_cert, private_key
 
-    proc = subprocess.Popen(['expect'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    stdout, stderr = proc.communicate(test_script)
-
-    if proc.returncode != 0 or "Version:" not in stdout:
-        print("❌ Cannot connect to FortiGate via SSH")
-        print("   Check credentials and network connectivity")
-        sys.exit(1)
-
-    print("✅ SSH connection successful")
+def print_banner(targets=None):
+    print("🔐 Installing CA-signed certificate on FortiGate via SSH...")
+    print(f"📍 Target: {', '.join(targets) if targets else FORTIGATE_IP}")
+    print(f"👤 User: {FORTIGATE_USER}")
     print()
 
-    print("🔄 Step 2: Installing server certificate and private key...")
-
-    # Create FortiGate CLI commands
-    install_script = f"""
-spawn ssh -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null {FORTIGATE_USER}@{FORTIGATE_IP}
-set timeout 60
-expect "password:"
-send "{FORTIGATE_PASS}\\r"
-expect "#"
-
-send "config vpn certificate local\\r"
-expect "#"
-
-send "edit \\"fortigate.netintegrate.net\\"\\r"
-expect "#"
-
-send "set certificate \\"{server_cert_escaped}\\"\\r"
-expect "#"
-
-send "set private-key \\"{private_key_escaped}\\"\\r"
-expect "#"
+def print_next_steps():
+    print("✅ Certificate installation completed successfully!")
+    print()
+    print("🎯 Next steps:")
+    print("1. Wait 30 seconds for FortiGate to apply changes")
+    print("2. Add DNS entry:")
+    print("   echo '192.168.0.254 fortigate.netintegrate.net' | sudo -S tee -a /etc/hosts")
+    print("3. Update your .env file:")
+    print("   FGT_URL=https://fortigate.netintegrate.net:8443")
+    print("   ALLOW_SELF_SIGNED=false")
+    print("4. Test the dashboard: curl http://localhost:59169/api/test")
+    print()
 
-send "set comments \\"CA-signed certificate from NetIntegrate CA\\"\\r"
-expect "#"
+# Cap simultaneous handshakes below sshd's default MaxStartups=10:30:60 so
+# a fleet rollout doesn't trip the unauthenticated-connection limit
+MAX_CONCURRENT_HANDSHAKES = 8
+MAX_RETRIES = 3
 
-send "next\\r"
-expect "#"
+class InstallError(Exception):
+    """A certificate installation step failed on one device"""
 
-send "end\\r"
-expect "#"
+async def main():
+    # Hosts may be passed on the command line for fleet rollouts;
+    # default to the single configured FortiGate
+    targets = sys.argv[1:] or [FORTIGATE_IP]
 
-send "exit\\r"
-expect eof
-"""
+    print_banner(targets)
 
-    proc = subprocess.Popen(['expect'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    stdout, stderr = proc.communicate(install_script)
+    # The AsyncSSH path pushes the PEM files over SCP, so only the paths
+    # are needed here; the expect fallback still inlines the contents
+    cert_file = os.path.join(CERT_DIR, "fortigate.crt")
+    key_file = os.path.join(CERT_DIR, "fortigate.key")
 
-    if proc.returncode != 0:
-        print("❌ Failed to install certificate")
-        print(f"Error: {stderr}")
-        sys.exit(1)
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_HANDSHAKES)
+    queue = asyncio.Queue()
+    for host in targets:
+        queue.put_nowait((host, 0))
+
+    results = {}
+
+    async def worker():
+        while True:
+            try:
+                host, attempts = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            try:
+                async with semaphore:
+                    await install_on_host(host, cert_file, key_file)
+                results[host] = "✅ success"
+            except asyncssh.ChannelOpenError:
+                # Device hit its MaxSessions limit; requeue instead of failing
+                if attempts < MAX_RETRIES:
+                    await queue.put((host, attempts + 1))
+                else:
+                    results[host] = "❌ channel open failed after retries"
+            except (OSError, asyncssh.Error, InstallError) as e:
+                results[host] = f"❌ {e}"
+
+    workers = min(MAX_CONCURRENT_HANDSHAKES, len(targets))
+    await asyncio.gather(*[worker() for _ in range(workers)])
 
-    print("✅ Server certificate and private key installed")
+    print()
+    print("📊 Results:")
+    for host in targets:
+        print(f"   {host}: {results.get(host, '❌ not attempted')}")
     print()
 
-    print("🔄 Step 3: Configuring HTTPS to use new certificate...")
-
-    config_script = f"""
-spawn ssh -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null {FORTIGATE_USER}@{FORTIGATE_IP}
-expect "password:"
-send "{FORTIGATE_PASS}\\r"
-expect "#"
-
-send "config system global\\r"
-expect "#"
-
-send "set admin-server-cert \\"fortigate.netintegrate.net\\"\\r"
-expect "#"
-
-send "end\\r"
-expect "#"
+    if any(not status.startswith("✅") for status in results.values()):
+        sys.exit(1)
 
+    print_next_steps()
+
+async def install_on_host(host, cert_file, key_file):
+    """Install the certificate on one device over a pooled connection"""
+    pool = SSHPool(host, FORTIGATE_USER, FORTIGATE_PASS)
+    try:
+        async with pool.acquire() as conn:
+            await install_certificate(conn, cert_file, key_file, host)
+    finally:
+        await pool.close()
+
+async def install_certificate(conn, cert_file, key_file, host):
+    """Run the test/install/configure steps over one borrowed connection"""
+    print(f"🔄 [{host}] Step 1: Testing SSH connection...")
+
+    result = await conn.run("get system status")
+
+    if "Version:" not in result.stdout:
+        raise InstallError("not a FortiGate, or login landed in a restricted shell")
+
+    print(f"✅ [{host}] SSH connection successful")
+
+    print(f"🔄 [{host}] Step 2: Installing server certificate and private key...")
+
+    # Interactive shell keeps the FortiGate CLI config context open
+    process = await conn.create_process(term_type='xterm')
+    try:
+        await read_until_prompt(process)
+    except (asyncio.IncompleteReadError, asyncssh.Error) as e:
+        raise InstallError(f"shell closed before showing a prompt: {e}")
+
+    try:
+        # SCP the PEM files as binary streams instead of echoing multi-KB
+        # text through the interactive CLI one TTY round trip at a time
+        output = await send_commands(process, [
+            'config system global',
+            'set admin-scp enable',
+            'end',
+        ])
+        check_command_failures(output)
+
+        await asyncssh.scp(cert_file, (conn, 'fortigate.crt'))
+        await asyncssh.scp(key_file, (conn, 'fortigate.key'))
+
+        output = await send_commands(process, [
+            'execute vpn certificate local import scp fortigate.crt fortigate.key '
+            '"fortigate.netintegrate.net"',
+        ])
+        check_command_failures(output)
+    except FileNotFoundError:
+        raise InstallError(
+            f"certificate files not found in {CERT_DIR}/ - "
+            "run: node generate-fortigate-cert.js first"
+        )
+    except (asyncio.IncompleteReadError, asyncssh.Error) as e:
+        raise InstallError(f"failed to install certificate: {e}")
+
+    print(f"✅ [{host}] Server certificate and private key installed")
+
+    print(f"🔄 [{host}] Step 3: Configuring HTTPS to use new certificate...")
+
+    try:
+        output = await send_commands(process, [
+            'config system global',
+            'set admin-server-cert "fortigate.netintegrate.net"',
+            'end',
+        ])
+        check_command_failures(output)
+    except (asyncio.IncompleteReadError, asyncssh.Error) as e:
+        raise InstallError(f"failed to configure HTTPS certificate: {e}")
+
+    process.stdin.write("exit\n")
+    await process.wait_closed()
+
+    print(f"✅ [{host}] HTTPS configured to use new certificate")
+
+STEP_SENTINEL = "###STEP_DONE###"
+
+# Shared spawn/login boilerplate for the expect fallback. Multiplexed
+# sessions don't prompt for a password, so the login block accepts either
+# the password prompt or the shell prompt.
+EXPECT_SPAWN_TMPL = string.Template("""
+set timeout 60
+spawn ssh $ssh_opts $user@$host
+expect {
+    "password:" { send "$pw\\r"; exp_continue }
+    "#" {}
+}
+""")
+
+def expect_cli_block(commands):
+    """Build send/expect lines that wait for the prompt after each command"""
+    lines = []
+    for command in commands:
+        escaped = command.replace('"', '\\"')
+        lines.append(f'send "{escaped}\\r"\nexpect "#"')
+    return "\n".join(lines) + "\n"
+
+class ExpectSession:
+    """One long-lived expect child fed successive script blocks over stdin
+
+    A single fork/exec and Tcl interpreter startup serves every step, and
+    the spawned ssh inside it stays open across blocks. Each block is
+    terminated with a send_user sentinel so the caller can read the output
+    of one step at a time. The child runs under asyncio so the interpreter
+    isn't blocked for the seconds each SSH exchange takes - independent
+    sessions against other devices can overlap.
+    """
+
+    def __init__(self):
+        self.proc = None
+
+    async def start(self):
+        # -b makes expect execute stdin line by line; without it the whole
+        # script is slurped before anything runs, so the first run_step
+        # would deadlock waiting on a sentinel expect never gets to emit
+        self.proc = await asyncio.create_subprocess_exec(
+            'expect', '-b', '-',
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+
+    async def run_step(self, block):
+        """Feed one script block and return its output up to the sentinel"""
+        self.proc.stdin.write(block.encode())
+        self.proc.stdin.write(f'\nsend_user "{STEP_SENTINEL}\\n"\n'.encode())
+        await self.proc.stdin.drain()
+
+        lines = []
+        while True:
+            line = await self.proc.stdout.readline()
+            if not line:
+                break
+            text = line.decode(errors='replace')
+            if STEP_SENTINEL in text:
+                break
+            lines.append(text)
+        return "".join(lines)
+
+    async def close(self):
+        self.proc.stdin.close()
+        return await self.proc.wait()
+
+def check_command_failures(output):
+    """Raise if the FortiGate rejected any command in the step output"""
+    failures = [line.strip() for line in output.splitlines()
+                if "Command fail" in line]
+    if failures:
+        raise InstallError(
+            "FortiGate rejected one or more commands: " + "; ".join(failures)
+        )
+
+async def install_host_expect(host, server_cert, private_key):
+    """Run the three steps against one device inside one expect session"""
+    session = ExpectSession()
+    await session.start()
+
+    try:
+        print(f"🔄 [{host}] Step 1: Testing SSH connection...")
+
+        spawn_block = EXPECT_SPAWN_TMPL.substitute(
+            ssh_opts=SSH_OPTS,
+            user=FORTIGATE_USER,
+            host=host,
+            pw=FORTIGATE_PASS
+        )
+
+        output = await session.run_step(spawn_block + expect_cli_block([
+            'get system status',
+        ]))
+
+        if "Version:" not in output:
+            raise InstallError(
+                "cannot connect via SSH - check credentials and network connectivity"
+            )
+
+        print(f"✅ [{host}] SSH connection successful")
+
+        print(f"🔄 [{host}] Step 2: Installing server certificate and private key...")
+
+        output = await session.run_step(expect_cli_block([
+            'config vpn certificate local',
+            'edit "fortigate.netintegrate.net"',
+            f'set certificate "{server_cert}"',
+            f'set private-key "{private_key}"',
+            'set comments "CA-signed certificate from NetIntegrate CA"',
+            'next',
+            'end',
+        ]))
+
+        check_command_failures(output)
+
+        print(f"✅ [{host}] Server certificate and private key installed")
+
+        print(f"🔄 [{host}] Step 3: Configuring HTTPS to use new certificate...")
+
+        output = await session.run_step(expect_cli_block([
+            'config system global',
+            'set admin-server-cert "fortigate.netintegrate.net"',
+            'end',
+        ]))
+
+        check_command_failures(output)
+
+        await session.run_step("""
 send "exit\\r"
 expect eof
-"""
+""")
+
+        print(f"✅ [{host}] HTTPS configured to use new certificate")
+    finally:
+        await session.close()
+        # Tear down the shared control master
+        subprocess.run(
+            ['ssh', '-O', 'exit', '-o', f'ControlPath={SSH_CONTROL_PATH}',
+             f'{FORTIGATE_USER}@{host}'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+
+async def main_expect():
+    """Fallback flow for hosts without asyncssh: expect + SSH connection sharing
+
+    ControlMaster=auto makes the ssh spawned here open a control socket so
+    follow-on runs attach over the existing channel in microseconds,
+    skipping the handshake and password auth. Multiplexed sessions don't
+    prompt for a password, so the login block accepts either the password
+    prompt or the shell prompt. Honors the same command-line target list
+    as the AsyncSSH path, one device at a time.
+    """
+    targets = sys.argv[1:] or [FORTIGATE_IP]
+
+    print_banner(targets)
+
+    server_cert, private_key = load_certificates()
+
+    results = {}
+    for host in targets:
+        try:
+            await install_host_expect(host, server_cert, private_key)
+            results[host] = "✅ success"
+        except InstallError as e:
+            results[host] = f"❌ {e}"
 
-    proc = subprocess.Popen(['expect'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    stdout, stderr = proc.communicate(config_script)
+    print()
+    print("📊 Results:")
+    for host in targets:
+        print(f"   {host}: {results[host]}")
+    print()
 
-    if proc.returncode != 0:
-        print("❌ Failed to configure HTTPS certificate")
+    if any(not status.startswith("✅") for status in results.values()):
         sys.exit(1)
 
-    print("✅ HTTPS configured to use new certificate")
-    print()
-
-    print("✅ Certificate installation completed successfully!")
-    print()
-    print("🎯 Next steps:")
-    print("1. Wait 30 seconds for FortiGate to apply changes")
-    print("2. Add DNS entry:")
-    print("   echo '192.168.0.254 fortigate.netintegrate.net' | sudo -S tee -a /etc/hosts")
-    print("3. Update your .env file:")
-    print("   FGT_URL=https://fortigate.netintegrate.net:8443")
-    print("   ALLOW_SELF_SIGNED=false")
-    print("4. Test the dashboard: curl http://localhost:59169/api/test")
-    print()
+    print_next_steps()
 
 if __name__ == "__main__":
-    main()
+    if asyncssh is None:
+        asyncio.run(main_expect())
+    else:
+        asyncio.run(main())